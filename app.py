@@ -5,19 +5,27 @@ App Flask para Gerenciamento de Prospecção de Terrenos
 Mivita - Análise Geoespacial de Lotes Urbanos
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, request, Response
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
+import brotli
 import geopandas as gpd
-from shapely import from_wkb
-from shapely.geometry import Polygon
-import pandas as pd
-import json
+import numpy as np
+import orjson
+import pyarrow.parquet as pq
+import shapely
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from shapely.geometry import shape, mapping
-from shapely.ops import unary_union
+from pyproj import Transformer
 import logging
 
 # Importar módulo de relatórios
-from report import TerrainAnalyzer
+from report import TerrainAnalyzer, LotGeometryStore, resolve_columns, categorize_columns
 
 # Configuração de logging
 logging.basicConfig(
@@ -30,9 +38,87 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
 
+# Compressão das respostas (GeoJSON de coordenadas comprime muito bem)
+# Respostas que já definem Content-Encoding (cache de lotes) não são recomprimidas
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/css', 'application/javascript']
+Compress(app)
+
 # Variável global para armazenar dados
 GEOJSON_DATA = None
 GEOJSON_PATH = Path(__file__).parent / './data/renda_setores_vix.parquet'
+SOURCE_CRS = "EPSG:31984"  # CRS real das coordenadas gravadas no parquet
+
+# Cache em disco das respostas de /api/lotes/<bairro> (GeoJSON comprimido com Brotli)
+LOTES_CACHE_ROOT = Path(__file__).parent / 'data' / 'cache'
+LOTES_CACHE_MEMORY_SIZE = 5  # bairros mais requisitados mantidos em memória
+BROTLI_QUALITY = 9
+LOTES_CACHE_VERSION = 2  # incrementar sempre que o formato do corpo de /api/lotes mudar
+
+# Possíveis nomes da coluna de bairro (pode ser 'bairro', 'BAIRRO', 'nome', etc)
+BAIRRO_COLUMNS = ('bairro', 'BAIRRO', 'Bairro', 'nome', 'NOME', 'Nome', 'neighborhood')
+
+# Blocos de informação aceitos por TerrainAnalyzer.calculate_info
+INFO_FIELDS = frozenset({'area', 'perimetro', 'zoneamento', 'informacoes_adicionais'})
+
+# Índices pré-calculados na carga dos dados
+app.config['BAIRRO_COL'] = None
+app.config['BAIRRO_INDEX'] = {}
+app.config['BAIRROS_SORTED'] = []
+app.config['BAIRROS_BODY'] = None
+app.config['TOTAL_BOUNDS'] = None
+app.config['MAP_BOUNDS_BODY'] = None
+app.config['LOTES_CACHE_DIR'] = None
+app.config['GEOMETRY_STORE'] = None
+app.config['STRTREE'] = None
+app.config['COLUMNS'] = None
+
+
+def json_bytes(obj):
+    """Serializa um objeto com orjson (bytes direto, com suporte a tipos NumPy)"""
+    return orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def parse_fields(value):
+    """
+    Converte os campos pedidos pelo cliente no conjunto usado por calculate_info
+    
+    Aceita uma string separada por vírgulas ('area,perimetro') ou uma lista de
+    strings. Retorna None quando nada foi pedido.
+    
+    Raises:
+        ValueError: Tipo inválido ou nome de campo desconhecido
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(field, str) for field in value):
+        raise ValueError("'fields' deve ser uma string ou uma lista de strings")
+    
+    fields = {field.strip() for field in value if field.strip()}
+    unknown = fields - INFO_FIELDS
+    if unknown:
+        raise ValueError(f"Campos desconhecidos: {', '.join(sorted(unknown))}")
+    return fields or None
+
+
+def fast_jsonify(obj, status=200):
+    """Monta a resposta JSON serializada com orjson"""
+    return Response(json_bytes(obj), status=status, mimetype='application/json')
+
+
+class OrjsonProvider(JSONProvider):
+    """Provedor JSON do Flask baseado em orjson (usado por request.get_json)"""
+    
+    def dumps(self, obj, **kwargs):
+        return json_bytes(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app.json = OrjsonProvider(app)
 
 
 def load_geojson():
@@ -45,15 +131,48 @@ def load_geojson():
         return None
     
     try:
-        gdf = pd.read_parquet(GEOJSON_PATH)
-        geo = from_wkb(gdf["geometry"].values)
+        try:
+            # GeoParquet: leitura e decodificação das geometrias em uma única passagem
+            gdf = gpd.read_parquet(GEOJSON_PATH)
+        except ValueError:
+            # Parquet sem metadados 'geo': decodificar o WKB direto do array Arrow
+            table = pq.read_table(GEOJSON_PATH)
+            geo = shapely.from_wkb(table.column("geometry").to_numpy())
+            gdf = gpd.GeoDataFrame(table.drop_columns(["geometry"]).to_pandas(), geometry=geo)
+        
         # Dados estão em EPSG:31984 (UTM zona 25S) - Vitória, ES
-        gdf = gpd.GeoDataFrame(gdf.drop(columns="geometry"), geometry=geo, crs="EPSG:31984")
-        gdf = gdf.to_crs(epsg=4326)
+        # O rótulo de CRS gravado no arquivo (EPSG:4326) não corresponde às
+        # coordenadas, então é sempre sobrescrito
+        gdf = gdf.set_crs(SOURCE_CRS, allow_override=True)
+        
+        geo = np.asarray(gdf.geometry.values)
+        gdf = gpd.GeoDataFrame(
+            gdf.drop(columns=gdf.geometry.name),
+            geometry=reproject_to_wgs84(geo),
+            crs="EPSG:4326"
+        )
+        # Rótulos = posições: o id das features (geodataframe_to_geojson) é o
+        # mesmo índice posicional aceito por /api/unir-lotes e /api/info-lote
+        gdf = gdf.reset_index(drop=True)
+        # Geometrias originais em UTM e suas coordenadas empacotadas, fora do
+        # GeoDataFrame, para cálculos métricos (evita reprojetar de volta)
+        app.config['GEOMETRY_STORE'] = LotGeometryStore(geo)
+        
+        # Resolver uma única vez quais colunas de atributos existem nos dados
+        app.config['COLUMNS'] = resolve_columns(gdf.columns)
+        categorize_columns(gdf, app.config['COLUMNS'])
+        
+        build_bairro_index(gdf)
+        build_map_bounds(gdf)
+        
+        # Índice espacial (STR-tree) construído uma única vez para consultas por área
+        app.config['STRTREE'] = shapely.STRtree(np.asarray(gdf.geometry.values))
+        build_lotes_cache(gdf)
         
         logger.info(f"GeoJSON carregado com sucesso: {len(gdf)} features")
         logger.info(f"Colunas disponíveis: {list(gdf.columns)}")
         
+        GEOJSON_DATA = gdf
         return gdf
     
     except Exception as e:
@@ -61,227 +180,490 @@ def load_geojson():
         return None
 
 
-@app.route('/')
-def index():
-    """Página principal"""
-    return render_template('index.html')
-
-
-@app.route('/api/map-bounds', methods=['GET'])
-def get_map_bounds():
+def reproject_to_wgs84(geometries):
     """
-    Retorna o centro e bounds dos dados para centralizar o mapa dinamicamente
+    Reprojeta geometrias de EPSG:31984 para EPSG:4326 em lotes paralelos
+    
+    Cada thread transforma um bloco de coordenadas com seu próprio Transformer
+    (o PROJ libera o GIL durante a transformação).
+    
+    Args:
+        geometries: np.ndarray de geometrias em EPSG:31984
+    
+    Returns:
+        np.ndarray: Novas geometrias em EPSG:4326
     """
-    if GEOJSON_DATA is None:
-        return jsonify({
-            'success': False,
-            'error': 'Dados não carregados'
-        }), 500
+    n_chunks = max(1, min(os.cpu_count() or 1, len(geometries)))
+    
+    def transform_chunk(chunk):
+        # Transformer não é thread-safe: um por bloco
+        transformer = Transformer.from_crs("EPSG:31984", "EPSG:4326", always_xy=True)
+        coords = shapely.get_coordinates(chunk)
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        # set_coordinates altera o array recebido: trabalhar sobre uma cópia
+        return shapely.set_coordinates(chunk.copy(), np.column_stack([x, y]))
+    
+    with ThreadPoolExecutor(max_workers=n_chunks) as executor:
+        chunks = executor.map(transform_chunk, np.array_split(geometries, n_chunks))
+        return np.concatenate(list(chunks))
+
+
+def build_bairro_index(gdf):
+    """Identifica a coluna de bairro e indexa as linhas de cada bairro uma única vez"""
+    bairro_col = next((col for col in BAIRRO_COLUMNS if col in gdf.columns), None)
+    app.config['BAIRRO_COL'] = bairro_col
+    
+    if bairro_col is None:
+        logger.warning("Coluna de bairro não identificada automaticamente")
+        return
+    
+    # Categórica: agrupamentos e filtros passam a comparar códigos inteiros
+    gdf[bairro_col] = gdf[bairro_col].astype('category')
+    
+    # bairro -> posições das linhas (np.ndarray de int64)
+    bairro_index = gdf.groupby(bairro_col, observed=True).indices
+    bairros = sorted(bairro_index.keys())
+    
+    app.config['BAIRRO_INDEX'] = bairro_index
+    app.config['BAIRROS_SORTED'] = bairros
+    app.config['BAIRROS_BODY'] = orjson.dumps({
+        'success': True,
+        'bairros': bairros,
+        'total': len(bairros)
+    }, option=orjson.OPT_SERIALIZE_NUMPY)
     
+    logger.info(f"Índice de bairros criado: {len(bairros)} bairros (coluna '{bairro_col}')")
+
+
+def build_map_bounds(gdf):
+    """Calcula os bounds totais e a resposta de /api/map-bounds uma única vez"""
     try:
-        # Calcular bounds de todos os dados
-        bounds = GEOJSON_DATA.total_bounds  # [minx, miny, maxx, maxy]
+        # Envelope de cada geometria (N x 4), reduzido para o bounds total
+        bounds = shapely.bounds(np.asarray(gdf.geometry.values))
+        total_bounds = (
+            float(np.nanmin(bounds[:, 0])), float(np.nanmin(bounds[:, 1])),
+            float(np.nanmax(bounds[:, 2])), float(np.nanmax(bounds[:, 3]))
+        )  # [minx, miny, maxx, maxy]
         
         # Calcular centro
-        center_lon = (bounds[0] + bounds[2]) / 2
-        center_lat = (bounds[1] + bounds[3]) / 2
+        center_lon = (total_bounds[0] + total_bounds[2]) / 2
+        center_lat = (total_bounds[1] + total_bounds[3]) / 2
         
-        logger.info(f"Bounds calculados: {bounds}, Centro: [{center_lat}, {center_lon}]")
-        
-        return jsonify({
+        app.config['TOTAL_BOUNDS'] = total_bounds
+        app.config['MAP_BOUNDS_BODY'] = orjson.dumps({
             'success': True,
             'center': [center_lat, center_lon],
             'bounds': [
-                [bounds[1], bounds[0]],  # southwest [lat, lon]
-                [bounds[3], bounds[2]]   # northeast [lat, lon]
+                [total_bounds[1], total_bounds[0]],  # southwest [lat, lon]
+                [total_bounds[3], total_bounds[2]]   # northeast [lat, lon]
             ]
         })
+        
+        logger.info(f"Bounds calculados: {total_bounds}, Centro: [{center_lat}, {center_lon}]")
     
     except Exception as e:
         logger.error(f"Erro ao calcular bounds: {str(e)}")
-        return jsonify({
+
+
+def build_lotes_cache(gdf):
+    """
+    Pré-serializa a resposta de /api/lotes/<bairro> de cada bairro em disco
+    
+    Os arquivos ficam em um diretório identificado pelo parquet de origem
+    (tamanho + data de modificação), pela versão do formato e pelo CRS de
+    origem, então só são regerados quando algum deles muda. Diretórios de
+    versões anteriores são removidos.
+    """
+    stat = GEOJSON_PATH.stat()
+    key = f"{LOTES_CACHE_VERSION}-{SOURCE_CRS}-{stat.st_size}-{stat.st_mtime_ns}"
+    fingerprint = hashlib.sha1(key.encode()).hexdigest()[:12]
+    cache_dir = LOTES_CACHE_ROOT / fingerprint
+    
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for old_dir in LOTES_CACHE_ROOT.iterdir():
+            if old_dir.is_dir() and old_dir != cache_dir:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        
+        app.config['LOTES_CACHE_DIR'] = cache_dir
+        load_lotes_body.cache_clear()
+        
+        created = 0
+        for bairro, positions in app.config['BAIRRO_INDEX'].items():
+            path = lotes_cache_path(bairro)
+            if not path.exists():
+                write_lotes_cache(path, build_lotes_body(bairro, gdf.take(positions)))
+                created += 1
+        
+        logger.info(f"Cache de lotes em {cache_dir}: {created} bairros gerados")
+    
+    except Exception as e:
+        app.config['LOTES_CACHE_DIR'] = None
+        logger.error(f"Erro ao gerar cache de lotes: {str(e)}")
+
+
+def lotes_cache_path(bairro):
+    """Caminho do arquivo de cache de um bairro"""
+    name = hashlib.sha1(str(bairro).encode('utf-8')).hexdigest()
+    return app.config['LOTES_CACHE_DIR'] / f"{name}.geojson.br"
+
+
+def write_lotes_cache(path, body):
+    """Comprime e grava o corpo da resposta (escrita atômica)"""
+    compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    # Nome temporário único: vários workers podem gerar o mesmo bairro ao mesmo tempo
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as tmp:
+        tmp.write(compressed)
+    try:
+        os.replace(tmp.name, path)
+    except OSError:
+        os.unlink(tmp.name)
+        raise
+    return compressed
+
+
+@lru_cache(maxsize=LOTES_CACHE_MEMORY_SIZE)
+def load_lotes_body(bairro):
+    """
+    Retorna o corpo comprimido (Brotli) de /api/lotes/<bairro>
+    
+    Lê do cache em disco, gerando o arquivo caso ainda não exista. Os bairros
+    mais requisitados ficam em memória (LRU).
+    """
+    positions = app.config['BAIRRO_INDEX'][bairro]
+    
+    if app.config['LOTES_CACHE_DIR'] is None:
+        return brotli.compress(build_lotes_body(bairro, GEOJSON_DATA.take(positions)), quality=BROTLI_QUALITY)
+    
+    path = lotes_cache_path(bairro)
+    if path.exists():
+        return path.read_bytes()
+    
+    return write_lotes_cache(path, build_lotes_body(bairro, GEOJSON_DATA.take(positions)))
+
+
+def build_lotes_body(bairro, filtered):
+    """Monta o corpo JSON de /api/lotes/<bairro> com o GeoJSON já serializado embutido"""
+    return (
+        b'{"success":true,"bairro":' + orjson.dumps(bairro)
+        + b',"total_lotes":' + str(len(filtered)).encode()
+        + b',"geojson":' + geodataframe_to_geojson(filtered) + b'}'
+    )
+
+
+def geodataframe_to_geojson(gdf):
+    """
+    Serializa um GeoDataFrame como FeatureCollection (bytes JSON)
+    
+    As geometrias são escritas diretamente pelo GEOS (shapely.to_geojson) e as
+    propriedades via orjson, sem montar dicts Python com as coordenadas.
+    """
+    geometries = shapely.to_geojson(np.asarray(gdf.geometry.values))
+    properties = gdf.drop(columns=gdf.geometry.name).to_dict(orient="records")
+    
+    features = [
+        b'{"id":' + str(idx).encode()
+        + b',"type":"Feature","properties":'
+        + orjson.dumps(props, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+        + b',"geometry":' + (geom.encode() if geom is not None else b'null')
+        + b'}'
+        for idx, props, geom in zip(gdf.index, properties, geometries)
+    ]
+    
+    return b'{"type":"FeatureCollection","features":[' + b','.join(features) + b']}'
+
+
+@app.route('/')
+def index():
+    """Página principal"""
+    return render_template('index.html')
+
+
+@app.route('/api/map-bounds', methods=['GET'])
+def get_map_bounds():
+    """
+    Retorna o centro e bounds dos dados para centralizar o mapa dinamicamente
+    """
+    if GEOJSON_DATA is None:
+        return fast_jsonify({
             'success': False,
-            'error': str(e)
-        }), 500
+            'error': 'Dados não carregados'
+        }, 500)
+    
+    if app.config['MAP_BOUNDS_BODY'] is None:
+        return fast_jsonify({
+            'success': False,
+            'error': 'Bounds não calculados'
+        }, 500)
+    
+    # Resposta já serializada na carga dos dados
+    return Response(app.config['MAP_BOUNDS_BODY'], mimetype='application/json')
 
 
 @app.route('/api/bairros', methods=['GET'])
 def get_bairros():
     """Retorna lista de bairros únicos disponíveis"""
     if GEOJSON_DATA is None:
-        return jsonify({
+        return fast_jsonify({
             'success': False,
             'error': 'Dados GeoJSON não carregados. Adicione terrenos.geojson na raiz do projeto.'
-        }), 500
+        }, 500)
     
     try:
-        # Identificar coluna de bairro (pode ser 'bairro', 'BAIRRO', 'nome', etc)
-        bairro_col = None
-        for col in ['bairro', 'BAIRRO', 'Bairro', 'nome', 'NOME', 'Nome', 'neighborhood']:
-            if col in GEOJSON_DATA.columns:
-                bairro_col = col
-                break
-        
-        if bairro_col is None:
-            logger.warning("Coluna de bairro não identificada automaticamente")
-            return jsonify({
+        if app.config['BAIRRO_COL'] is None:
+            return fast_jsonify({
                 'success': False,
                 'error': 'Coluna de bairro não encontrada no GeoJSON',
                 'available_columns': list(GEOJSON_DATA.columns)
-            }), 400
+            }, 400)
         
-        bairros = sorted(GEOJSON_DATA[bairro_col].dropna().unique().tolist())
-        
-        logger.info(f"Retornando {len(bairros)} bairros")
-        return jsonify({
-            'success': True,
-            'bairros': bairros,
-            'total': len(bairros)
-        })
+        # Lista e resposta já calculadas na carga dos dados
+        logger.info(f"Retornando {len(app.config['BAIRROS_SORTED'])} bairros")
+        return Response(app.config['BAIRROS_BODY'], mimetype='application/json')
     
     except Exception as e:
         logger.error(f"Erro ao buscar bairros: {str(e)}")
-        return jsonify({
+        return fast_jsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/api/lotes/<bairro>', methods=['GET'])
 def get_lotes_by_bairro(bairro):
     """Retorna todos os lotes de um bairro específico"""
     if GEOJSON_DATA is None:
-        return jsonify({
+        return fast_jsonify({
             'success': False,
             'error': 'Dados GeoJSON não carregados'
-        }), 500
+        }, 500)
     
     try:
-        # Identificar coluna de bairro
-        bairro_col = None
-        for col in ['bairro', 'BAIRRO', 'Bairro', 'nome', 'NOME', 'Nome', 'neighborhood']:
-            if col in GEOJSON_DATA.columns:
-                bairro_col = col
-                break
-        
-        if bairro_col is None:
-            return jsonify({
+        if app.config['BAIRRO_COL'] is None:
+            return fast_jsonify({
                 'success': False,
                 'error': 'Coluna de bairro não encontrada'
-            }), 400
+            }, 400)
         
-        # Filtrar lotes do bairro
-        filtered = GEOJSON_DATA[GEOJSON_DATA[bairro_col] == bairro]
+        # Posições dos lotes do bairro (índice pré-calculado)
+        positions = app.config['BAIRRO_INDEX'].get(bairro)
         
-        if len(filtered) == 0:
-            return jsonify({
+        if positions is None or len(positions) == 0:
+            return fast_jsonify({
                 'success': False,
                 'error': f'Nenhum lote encontrado para o bairro {bairro}'
-            }), 404
+            }, 404)
         
-        # Converter para GeoJSON
-        geojson = json.loads(filtered.to_json())
+        # Resposta pré-serializada e comprimida (cache em disco + LRU em memória)
+        body = load_lotes_body(bairro)
         
-        logger.info(f"Retornando {len(filtered)} lotes do bairro {bairro}")
-        return jsonify({
-            'success': True,
-            'bairro': bairro,
-            'total_lotes': len(filtered),
-            'geojson': geojson
+        logger.info(f"Retornando {len(positions)} lotes do bairro {bairro}")
+        
+        if 'br' in request.accept_encodings:
+            return Response(body, mimetype='application/json', headers={
+                'Content-Encoding': 'br',
+                'Vary': 'Accept-Encoding'
+            })
+        
+        return Response(brotli.decompress(body), mimetype='application/json', headers={
+            'Vary': 'Accept-Encoding'
         })
     
     except Exception as e:
         logger.error(f"Erro ao buscar lotes: {str(e)}")
-        return jsonify({
+        return fast_jsonify({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+
+@app.route('/api/lotes-in-bbox', methods=['GET'])
+def get_lotes_in_bbox():
+    """
+    Retorna as posições dos lotes que intersectam um retângulo
+    
+    Parâmetro bbox no formato 'oeste,sul,leste,norte' (lon/lat, como
+    map.getBounds().toBBoxString() do Leaflet).
+    """
+    if GEOJSON_DATA is None or app.config['STRTREE'] is None:
+        return fast_jsonify({
+            'success': False,
+            'error': 'Dados GeoJSON não carregados'
+        }, 500)
+    
+    try:
+        try:
+            minx, miny, maxx, maxy = (float(v) for v in request.args.get('bbox', '').split(','))
+        except ValueError:
+            return fast_jsonify({
+                'success': False,
+                'error': "Parâmetro 'bbox' inválido (esperado: oeste,sul,leste,norte)"
+            }, 400)
+        
+        # Consulta no índice espacial: O(log N) em vez de varrer todas as geometrias
+        indices = app.config['STRTREE'].query(
+            shapely.box(minx, miny, maxx, maxy), predicate='intersects'
+        )
+        indices = np.sort(indices)
+        
+        logger.info(f"Retornando {len(indices)} lotes no retângulo")
+        return fast_jsonify({
+            'success': True,
+            'total_lotes': len(indices),
+            'indices': indices
+        })
+    
+    except Exception as e:
+        logger.error(f"Erro ao buscar lotes no retângulo: {str(e)}")
+        return fast_jsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/api/unir-lotes', methods=['POST'])
 def unir_lotes():
     """Une múltiplos lotes selecionados e calcula informações"""
     if GEOJSON_DATA is None:
-        return jsonify({
+        return fast_jsonify({
             'success': False,
             'error': 'Dados GeoJSON não carregados'
-        }), 500
+        }, 500)
     
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if data is None:
+            # Corpo malformado ou Content-Type diferente de application/json
+            return fast_jsonify({
+                'success': False,
+                'error': 'Corpo da requisição não é um JSON válido'
+            }, 400)
+        if not isinstance(data, dict):
+            return fast_jsonify({
+                'success': False,
+                'error': 'Corpo da requisição deve ser um objeto JSON'
+            }, 400)
+        
+        try:
+            fields = parse_fields(data.get('fields'))
+        except ValueError as e:
+            return fast_jsonify({
+                'success': False,
+                'error': str(e)
+            }, 400)
+        
         indices = data.get('indices', [])
         
-        if not indices or len(indices) == 0:
-            return jsonify({
+        if isinstance(indices, list) and len(indices) == 0:
+            return fast_jsonify({
                 'success': False,
                 'error': 'Nenhum lote selecionado'
-            }), 400
+            }, 400)
         
-        # Filtrar lotes pelos índices
-        selected_lots = GEOJSON_DATA.iloc[indices]
+        try:
+            if not isinstance(indices, list):
+                raise TypeError(indices)
+            raw = np.asarray(indices)
+            if raw.dtype.kind == 'U':
+                # Ids em texto ("12"): aceitos se forem números inteiros ("1.5" gera ValueError)
+                indices = raw.astype(np.int64).ravel()
+            elif raw.dtype.kind in 'iuf':
+                # Valores fora do int64 (1e29, nan) viram lixo no cast e falham na comparação
+                with np.errstate(invalid='ignore'):
+                    indices = raw.astype(np.int64).ravel()
+                if np.any(raw.ravel() != indices):
+                    raise ValueError(indices)
+            else:
+                raise TypeError(indices)
+        except (TypeError, ValueError, OverflowError):
+            return fast_jsonify({
+                'success': False,
+                'error': 'Índices de lote inválidos'
+            }, 400)
+        
+        # Ids são posições de linha: qualquer valor fora do intervalo é erro do
+        # cliente (não é descartado em silêncio); repetidos são removidos
+        indices = np.unique(indices)
+        
+        if len(indices) == 0 or indices[0] < 0 or indices[-1] >= len(GEOJSON_DATA):
+            return fast_jsonify({
+                'success': False,
+                'error': 'Índice de lote inválido'
+            }, 400)
         
-        # Criar analisador
-        analyzer = TerrainAnalyzer(selected_lots)
+        # Criar analisador para os lotes selecionados
+        analyzer = TerrainAnalyzer(
+            GEOJSON_DATA, indices, app.config['GEOMETRY_STORE'], app.config['COLUMNS']
+        )
         
         # Unir geometrias
         unified_geom = analyzer.unify_lots()
         
-        # Calcular informações
-        info = analyzer.calculate_info()
+        # Calcular apenas o que o cliente pediu (padrão: todas as informações)
+        info = analyzer.calculate_info(fields)
         
-        # Converter geometria unida para GeoJSON
-        unified_geojson = mapping(unified_geom)
+        # Converter geometria unida para GeoJSON (escrito direto pelo GEOS)
+        unified_geojson = shapely.to_geojson(unified_geom).encode()
         
-        logger.info(f"Unidos {len(indices)} lotes - Área total: {info['area_total_m2']:.2f} m²")
+        logger.info(f"Unidos {len(indices)} lotes")
         
-        return jsonify({
-            'success': True,
-            'total_lotes_unidos': len(indices),
-            'geometry': unified_geojson,
-            'info': info
-        })
+        body = (
+            b'{"success":true,"total_lotes_unidos":' + str(len(indices)).encode()
+            + b',"geometry":' + unified_geojson
+            + b',"info":' + json_bytes(info) + b'}'
+        )
+        return Response(body, mimetype='application/json')
     
     except Exception as e:
         logger.error(f"Erro ao unir lotes: {str(e)}")
-        return jsonify({
+        return fast_jsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/api/info-lote/<int:index>', methods=['GET'])
 def get_lote_info(index):
     """Retorna informações detalhadas de um lote específico"""
     if GEOJSON_DATA is None:
-        return jsonify({
+        return fast_jsonify({
             'success': False,
             'error': 'Dados GeoJSON não carregados'
-        }), 500
+        }, 500)
     
     try:
         if index < 0 or index >= len(GEOJSON_DATA):
-            return jsonify({
+            return fast_jsonify({
                 'success': False,
                 'error': 'Índice de lote inválido'
-            }), 400
+            }, 400)
         
-        lote = GEOJSON_DATA.iloc[index]
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return fast_jsonify({
+                'success': False,
+                'error': str(e)
+            }, 400)
         
         # Criar analisador para lote único
-        analyzer = TerrainAnalyzer(GEOJSON_DATA.iloc[[index]])
-        info = analyzer.calculate_info()
+        analyzer = TerrainAnalyzer.from_index(
+            GEOJSON_DATA, index, app.config['GEOMETRY_STORE'], app.config['COLUMNS']
+        )
+        # ?fields=area,perimetro limita o cálculo (padrão: todas as informações)
+        info = analyzer.calculate_info(fields)
         
-        return jsonify({
+        return fast_jsonify({
             'success': True,
             'info': info
         })
     
     except Exception as e:
         logger.error(f"Erro ao buscar informações do lote: {str(e)}")
-        return jsonify({
+        return fast_jsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/report')
@@ -292,18 +674,18 @@ def report():
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({
+    return fast_jsonify({
         'success': False,
         'error': 'Rota não encontrada'
-    }), 404
+    }, 404)
 
 
 @app.errorhandler(500)
 def internal_error(error):
-    return jsonify({
+    return fast_jsonify({
         'success': False,
         'error': 'Erro interno do servidor'
-    }), 500
+    }, 500)
 
 
 if __name__ == '__main__':
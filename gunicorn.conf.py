@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração do gunicorn para produção
+
+Uso:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+# Com preload_app o app é importado no processo mestre: o gevent precisa
+# substituir threading/socket antes disso (e antes de qualquer outro import)
+from gevent import monkey
+monkey.patch_all()
+
+import multiprocessing
+
+bind = "0.0.0.0:5003"
+
+# Um worker por núcleo, com gevent para atender requisições concorrentes
+workers = multiprocessing.cpu_count()
+worker_class = "gevent"
+
+# Carrega os dados uma única vez no processo mestre; os workers compartilham
+# a memória via fork (copy-on-write) e não disputam a geração do cache de lotes
+preload_app = True
@@ -5,43 +5,306 @@ Módulo de Análise de Terrenos
 Mivita - Processamento Geoespacial e Cálculos
 """
 
-import geopandas as gpd
-from shapely.geometry import shape, mapping
-from shapely.ops import unary_union
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
 import logging
 
+try:
+    from numba import njit
+except ImportError:  # sem numba os kernels rodam em Python puro (mesmo resultado)
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 logger = logging.getLogger(__name__)
 
+# Transformações criadas uma única vez (montar o pipeline do PROJ é caro)
+# SIRGAS 2000 / UTM zone 24S
+_TO_UTM = Transformer.from_crs(4326, 31984, always_xy=True)
+_TO_WGS = Transformer.from_crs(31984, 4326, always_xy=True)
+
+# Colunas relacionadas a zoneamento
+ZONING_COLUMNS = (
+    'zona', 'zoneamento', 'zone', 'ZONA', 'ZONEAMENTO',
+    'uso', 'uso_solo', 'tipo_zona', 'categoria'
+)
+
+# Coeficientes e parâmetros urbanísticos
+PARAM_COLUMNS = (
+    'coeficiente', 'ca', 'coef_aproveitamento', 'taxa_ocupacao',
+    'to', 'gabarito', 'altura_max', 'recuo', 'testada_min'
+)
+
+# Outras informações relevantes dos lotes
+INFO_COLUMNS = (
+    'matricula', 'inscricao', 'proprietario', 'endereco',
+    'logradouro', 'numero', 'quadra', 'lote'
+)
+
+# Grupos de colunas candidatas
+COLUMN_GROUPS = {
+    'zoneamento': ZONING_COLUMNS,
+    'parametros': PARAM_COLUMNS,
+    'informacoes': INFO_COLUMNS,
+}
+
+
+def resolve_columns(columns):
+    """
+    Resolve quais colunas candidatas existem nos dados
+    
+    Args:
+        columns: Colunas do GeoDataFrame carregado
+    
+    Returns:
+        dict: Grupo ('zoneamento', 'parametros', 'informacoes') -> tupla das
+            colunas candidatas presentes, na ordem de COLUMN_GROUPS
+    """
+    present = set(columns)
+    return {
+        group: tuple(col for col in candidates if col in present)
+        for group, candidates in COLUMN_GROUPS.items()
+    }
+
+
+def categorize_columns(gdf, columns):
+    """
+    Converte as colunas de zoneamento e informações adicionais para categóricas
+    
+    Os valores únicos de uma seleção passam a ser obtidos dos códigos inteiros,
+    sem hash sobre strings a cada requisição.
+    
+    Args:
+        gdf: GeoDataFrame carregado (alterado no lugar)
+        columns: Colunas resolvidas por resolve_columns para o mesmo GeoDataFrame
+    """
+    for col in columns['zoneamento'] + columns['informacoes']:
+        gdf[col] = gdf[col].astype('category')
+
+
+def _transform_geometries(transformer, geometries):
+    """
+    Aplica uma transformação do PROJ a um array de geometrias
+    
+    Args:
+        transformer: pyproj.Transformer com always_xy=True
+        geometries: Geometrias de entrada (não são alteradas)
+    
+    Returns:
+        np.ndarray: Novas geometrias transformadas
+    """
+    geometries = np.array(geometries, dtype=object)
+    coords = shapely.get_coordinates(geometries)
+    x, y = transformer.transform(coords[:, 0], coords[:, 1])
+    return shapely.set_coordinates(geometries, np.column_stack([x, y]))
+
+
+@njit(fastmath=True, cache=True)
+def geometry_area(coords, ring_off, poly_off, geom_off, g):
+    """Área (fórmula do laço) da geometria `g`, descontando os buracos"""
+    total = 0.0
+    for p in range(geom_off[g], geom_off[g + 1]):
+        for r in range(poly_off[p], poly_off[p + 1]):
+            start = ring_off[r]
+            end = ring_off[r + 1]
+            # Coordenadas relativas ao primeiro vértice (evita perda de precisão em UTM)
+            x0 = coords[start, 0]
+            y0 = coords[start, 1]
+            a = 0.0
+            for i in range(start, end - 1):
+                a += ((coords[i, 0] - x0) * (coords[i + 1, 1] - y0)
+                      - (coords[i + 1, 0] - x0) * (coords[i, 1] - y0))
+            a = abs(a) * 0.5
+            # Primeiro anel do polígono é o exterior, os demais são buracos
+            total += a if r == poly_off[p] else -a
+    return total
+
+
+@njit(fastmath=True, cache=True)
+def geometry_perimeter(coords, ring_off, poly_off, geom_off, g):
+    """Comprimento de todos os anéis da geometria `g`"""
+    total = 0.0
+    for p in range(geom_off[g], geom_off[g + 1]):
+        for r in range(poly_off[p], poly_off[p + 1]):
+            for i in range(ring_off[r], ring_off[r + 1] - 1):
+                dx = coords[i + 1, 0] - coords[i, 0]
+                dy = coords[i + 1, 1] - coords[i, 1]
+                total += np.sqrt(dx * dx + dy * dy)
+    return total
+
+
+class LotGeometryStore:
+    """Coordenadas métricas de todos os lotes em arrays contíguos (estrutura de arrays)"""
+    
+    def __init__(self, geometries_utm):
+        """
+        Empacota as geometrias em arrays de coordenadas e offsets
+        
+        Args:
+            geometries_utm: Array com as geometrias (Polygon/MultiPolygon) em EPSG:31984
+        """
+        geometries = np.asarray(geometries_utm)
+        self.geometries = geometries  # mantidas para união e operações do GEOS
+        
+        polygons, polygon_geom = shapely.get_parts(geometries, return_index=True)
+        rings, ring_polygon = shapely.get_rings(polygons, return_index=True)
+        
+        self.coords = shapely.get_coordinates(rings)
+        self.ring_offsets = self._offsets(shapely.get_num_coordinates(rings))
+        self.poly_offsets = self._offsets(np.bincount(ring_polygon, minlength=len(polygons)))
+        self.geom_offsets = self._offsets(np.bincount(polygon_geom, minlength=len(geometries)))
+    
+    @staticmethod
+    def _offsets(counts):
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets
+    
+    def __len__(self):
+        return len(self.geom_offsets) - 1
+    
+    def area(self, index):
+        """Área (m²) do lote na posição `index`, direto do trecho de coordenadas"""
+        return float(geometry_area(self.coords, self.ring_offsets, self.poly_offsets,
+                                   self.geom_offsets, index))
+    
+    def perimeter(self, index):
+        """Perímetro (m) do lote na posição `index`, direto do trecho de coordenadas"""
+        return float(geometry_perimeter(self.coords, self.ring_offsets, self.poly_offsets,
+                                        self.geom_offsets, index))
+
 
 class TerrainAnalyzer:
     """Classe para análise e processamento de terrenos"""
     
-    def __init__(self, geodataframe):
+    def __init__(self, geodataframe, indices=None, geometry_store=None, columns=None):
         """
         Inicializa o analisador com um GeoDataFrame
         
         Args:
-            geodataframe: GeoDataFrame com um ou mais lotes
+            geodataframe: GeoDataFrame com os lotes (pode ser o conjunto completo)
+            indices: Posições dos lotes a analisar (padrão: todos)
+            geometry_store: LotGeometryStore com as coordenadas UTM do mesmo GeoDataFrame (opcional)
+            columns: Colunas já resolvidas por resolve_columns (opcional; padrão:
+                resolvidas a partir do GeoDataFrame quando necessário)
         """
-        self.gdf = geodataframe
+        n = len(geodataframe)
+        
+        if indices is None:
+            idx = np.arange(n, dtype=np.int64)
+        else:
+            idx = np.array(indices, dtype=np.int64).ravel()
+            idx[idx < 0] += n
+            if len(idx) and (idx.min() < 0 or idx.max() >= n):
+                raise IndexError("Índice de lote fora do intervalo")
+        
+        self.data = geodataframe
+        self.store = geometry_store
+        self.columns = columns
+        self._idx = idx
+        self._gdf = None
         self.unified_geometry = None
+        self._geoms_utm = None
+        self._unified_utm = None
+    
+    @classmethod
+    def from_index(cls, geodataframe, index, geometry_store=None, columns=None):
+        """
+        Cria um analisador para um único lote
+        
+        Não monta um GeoDataFrame de uma linha: área e perímetro vêm direto das
+        coordenadas UTM do lote e os atributos são lidos coluna a coluna.
+        
+        Args:
+            geodataframe: GeoDataFrame completo
+            index: Posição do lote
+            geometry_store: LotGeometryStore do mesmo GeoDataFrame (opcional)
+            columns: Colunas já resolvidas por resolve_columns (opcional)
+        """
+        return cls(geodataframe, [index], geometry_store, columns)
+    
+    @property
+    def gdf(self):
+        """GeoDataFrame apenas com os lotes selecionados (criado sob demanda)"""
+        if self._gdf is None:
+            self._gdf = self.data.take(self._idx)
+        return self._gdf
+    
+    def _present_columns(self, group):
+        """Colunas de um grupo resolvidas na carga ou, na falta delas, a partir dos dados"""
+        if self.columns is None:
+            self.columns = resolve_columns(self.data.columns)
+        return self.columns[group]
+    
+    def _column_values(self, col):
+        """Valores de uma coluna apenas para os lotes selecionados"""
+        return self.data[col].take(self._idx)
+    
+    def _unique_values(self, col):
+        """Valores únicos não nulos de uma coluna nos lotes selecionados, na ordem em que aparecem"""
+        column = self.data[col]
+        
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.array.codes[self._idx]
+            codes = codes[codes >= 0]  # -1 indica valor nulo
+            unique_codes, first = np.unique(codes, return_index=True)
+            return column.cat.categories.take(unique_codes[np.argsort(first)]).tolist()
+        
+        return self._column_values(col).dropna().unique().tolist()
+    
+    def _get_geoms_utm(self):
+        """
+        Retorna as geometrias em projeção métrica, reprojetando no máximo uma vez
+        
+        Returns:
+            np.ndarray: Geometrias em EPSG:31984
+        """
+        if self._geoms_utm is None:
+            if self.store is not None:
+                self._geoms_utm = self.store.geometries[self._idx]
+            elif self.gdf.crs is not None and self.gdf.crs.to_epsg() == 4326:
+                # Transformação pré-montada, sem criar um novo pipeline do PROJ
+                self._geoms_utm = _transform_geometries(_TO_UTM, self.gdf.geometry.values)
+            else:
+                self._geoms_utm = np.asarray(self.gdf.to_crs(epsg=31984).geometry.values)
+        return self._geoms_utm
+    
+    def _get_unified_utm(self):
+        """
+        Retorna a união dos lotes em projeção métrica (calculada uma única vez)
+        
+        Returns:
+            Shapely geometry em EPSG:31984
+        """
+        if self._unified_utm is None:
+            geoms = self._get_geoms_utm()
+            if len(geoms) == 1:
+                self._unified_utm = geoms[0]
+            else:
+                self._unified_utm = shapely.union_all(geoms)
+        return self._unified_utm
     
     def unify_lots(self):
         """
-        Une múltiplos lotes em uma única geometria
+        Une múltiplos lotes em uma única geometria (calculada uma única vez)
+        
+        A união é feita uma única vez em UTM (a mesma usada por área e
+        perímetro) e só o resultado é reprojetado para WGS84.
         
         Returns:
-            Shapely geometry com a união dos lotes
+            Shapely geometry com a união dos lotes (EPSG:4326)
         """
+        if self.unified_geometry is not None:
+            return self.unified_geometry
+        
         try:
-            geometries = self.gdf.geometry.tolist()
-            
-            if len(geometries) == 1:
-                self.unified_geometry = geometries[0]
+            if len(self._idx) == 1:
+                self.unified_geometry = self.data.geometry.values[self._idx[0]]
             else:
-                self.unified_geometry = unary_union(geometries)
+                self.unified_geometry = _transform_geometries(_TO_WGS, [self._get_unified_utm()])[0]
             
-            logger.info(f"Unidos {len(geometries)} lotes")
+            logger.info(f"Unidos {len(self._idx)} lotes")
             return self.unified_geometry
         
         except Exception as e:
@@ -52,22 +315,21 @@ class TerrainAnalyzer:
         """
         Calcula área total em m² (considerando projeção apropriada)
         
+        Os lotes podem se sobrepor, então com mais de um lote a área vem da
+        união (a mesma usada pelo perímetro, calculada uma única vez).
+        
         Returns:
             float: Área em metros quadrados
         """
         try:
-            # Se ainda não unificou, unificar
-            if self.unified_geometry is None:
-                self.unify_lots()
-            
-            # Converter para projeção métrica (UTM zone 24S para Espírito Santo)
-            gdf_metric = self.gdf.to_crs("EPSG:31984")  # SIRGAS 2000 / UTM zone 24S
-            
-            if len(gdf_metric) == 1:
-                area = gdf_metric.geometry.iloc[0].area
+            # Geometrias em projeção métrica (UTM zone 24S para Espírito Santo)
+            if len(self._idx) != 1:
+                area = float(shapely.area(self._get_unified_utm()))
+            elif self.store is not None:
+                # Lote único: direto das coordenadas, sem união
+                area = self.store.area(self._idx[0])
             else:
-                unified_metric = unary_union(gdf_metric.geometry.tolist())
-                area = unified_metric.area
+                area = float(shapely.area(self._get_geoms_utm()[0]))
             
             return round(area, 2)
         
@@ -85,21 +347,19 @@ class TerrainAnalyzer:
         """
         Calcula perímetro total em metros
         
+        Com mais de um lote usa a geometria unida (divisas compartilhadas entre
+        lotes vizinhos somem na união), a mesma usada pela área.
+        
         Returns:
             float: Perímetro em metros
         """
         try:
-            if self.unified_geometry is None:
-                self.unify_lots()
-            
-            # Converter para projeção métrica
-            gdf_metric = self.gdf.to_crs("EPSG:31984")
-            
-            if len(gdf_metric) == 1:
-                perimeter = gdf_metric.geometry.iloc[0].length
+            if self.store is not None and len(self._idx) == 1:
+                # Lote único: perímetro direto das coordenadas
+                perimeter = self.store.perimeter(self._idx[0])
             else:
-                unified_metric = unary_union(gdf_metric.geometry.tolist())
-                perimeter = unified_metric.length
+                # Geometria unida em projeção métrica
+                perimeter = float(shapely.length(self._get_unified_utm()))
             
             return round(perimeter, 2)
         
@@ -122,30 +382,18 @@ class TerrainAnalyzer:
         zoning_info = {}
         
         try:
-            # Buscar colunas relacionadas a zoneamento
-            zoning_columns = [
-                'zona', 'zoneamento', 'zone', 'ZONA', 'ZONEAMENTO',
-                'uso', 'uso_solo', 'tipo_zona', 'categoria'
-            ]
+            # Colunas relacionadas a zoneamento
+            for col in self._present_columns('zoneamento'):
+                # Pegar valores únicos
+                values = self._unique_values(col)
+                if values:
+                    zoning_info[col] = values[0] if len(values) == 1 else values
             
-            for col in zoning_columns:
-                if col in self.gdf.columns:
-                    # Pegar valores únicos
-                    values = self.gdf[col].dropna().unique().tolist()
-                    if values:
-                        zoning_info[col] = values[0] if len(values) == 1 else values
-            
-            # Buscar coeficientes e parâmetros urbanísticos
-            param_columns = [
-                'coeficiente', 'ca', 'coef_aproveitamento', 'taxa_ocupacao',
-                'to', 'gabarito', 'altura_max', 'recuo', 'testada_min'
-            ]
-            
-            for col in param_columns:
-                if col in self.gdf.columns:
-                    values = self.gdf[col].dropna().tolist()
-                    if values:
-                        zoning_info[col] = values[0] if len(values) == 1 else values
+            # Coeficientes e parâmetros urbanísticos
+            for col in self._present_columns('parametros'):
+                values = self._column_values(col).dropna().tolist()
+                if values:
+                    zoning_info[col] = values[0] if len(values) == 1 else values
             
             if not zoning_info:
                 zoning_info['status'] = 'Informações de zoneamento não disponíveis nos dados'
@@ -156,65 +404,65 @@ class TerrainAnalyzer:
             logger.error(f"Erro ao extrair informações de zoneamento: {str(e)}")
             return {'error': str(e)}
     
-    def calculate_info(self):
+    def calculate_info(self, fields=None):
         """
-        Calcula todas as informações do(s) lote(s)
+        Calcula as informações do(s) lote(s)
+        
+        Args:
+            fields: Conjunto com os blocos desejados ('area', 'perimetro',
+                'zoneamento', 'informacoes_adicionais'); None calcula todos
         
         Returns:
-            dict: Dicionário completo com todas as informações
+            dict: Dicionário com as informações solicitadas
         """
         try:
-            area = self.calculate_area()
-            perimeter = self.calculate_perimeter()
-            zoning = self.extract_zoning_info()
+            info = {'total_lotes': len(self._idx)}
             
-            # Informações adicionais dos lotes
-            additional_info = {}
+            if fields is None or 'area' in fields:
+                area = self.calculate_area()
+                info['area_total_m2'] = area
+                info['area_total_hectares'] = round(area / 10000, 4)
+                logger.info(f"Informações calculadas: {area:.2f} m²")
             
-            # Tentar extrair outras informações relevantes
-            info_columns = [
-                'matricula', 'inscricao', 'proprietario', 'endereco',
-                'logradouro', 'numero', 'quadra', 'lote'
-            ]
+            if fields is None or 'perimetro' in fields:
+                info['perimetro_m'] = self.calculate_perimeter()
             
-            for col in info_columns:
-                if col in self.gdf.columns:
-                    values = self.gdf[col].dropna().unique().tolist()
+            if fields is None or 'zoneamento' in fields:
+                info['zoneamento'] = self.extract_zoning_info()
+            
+            if fields is None or 'informacoes_adicionais' in fields:
+                # Informações adicionais dos lotes
+                additional_info = {}
+                
+                # Tentar extrair outras informações relevantes
+                for col in self._present_columns('informacoes'):
+                    values = self._unique_values(col)
                     if values:
                         additional_info[col] = values
+                
+                info['informacoes_adicionais'] = additional_info if additional_info else 'Não disponível'
             
-            info = {
-                'total_lotes': len(self.gdf),
-                'area_total_m2': area,
-                'area_total_hectares': round(area / 10000, 4),
-                'perimetro_m': perimeter,
-                'zoneamento': zoning,
-                'informacoes_adicionais': additional_info if additional_info else 'Não disponível'
-            }
-            
-            logger.info(f"Informações calculadas: {area:.2f} m²")
             return info
         
         except Exception as e:
             logger.error(f"Erro ao calcular informações: {str(e)}")
             return {
                 'error': str(e),
-                'total_lotes': len(self.gdf)
+                'total_lotes': len(self._idx)
             }
     
     def get_centroid(self):
         """
         Calcula o centroide da geometria unificada
         
+        O centroide é calculado na projeção métrica e convertido para WGS84.
+        
         Returns:
             tuple: (longitude, latitude)
         """
         try:
-            if self.unified_geometry is None:
-                self.unify_lots()
-            
-            centroid = self.unified_geometry.centroid
-            return (centroid.x, centroid.y)
+            centroid = shapely.centroid(self._get_unified_utm())
+            return _TO_WGS.transform(centroid.x, centroid.y)
         
         except Exception as e:
             logger.error(f"Erro ao calcular centroide: {str(e)}")
@@ -224,14 +472,17 @@ class TerrainAnalyzer:
         """
         Retorna os limites (bounding box) da geometria
         
+        O bounding box da união é o mesmo dos lotes individuais, então não é
+        preciso unir as geometrias.
+        
         Returns:
             tuple: (minx, miny, maxx, maxy)
         """
         try:
-            if self.unified_geometry is None:
-                self.unify_lots()
-            
-            return self.unified_geometry.bounds
+            geoms = np.asarray(self.data.geometry.values)[self._idx]
+            b = shapely.bounds(geoms)  # N x 4
+            return (float(b[:, 0].min()), float(b[:, 1].min()),
+                    float(b[:, 2].max()), float(b[:, 3].max()))
         
         except Exception as e:
             logger.error(f"Erro ao obter limites: {str(e)}")
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ponto de entrada WSGI para produção
+
+Uso:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app, load_geojson
+
+# Carregar dados na inicialização (uma vez no processo mestre com preload_app)
+if load_geojson() is None:
+    raise RuntimeError("Não foi possível carregar os dados GeoJSON")